@@ -6,14 +6,14 @@ from dataclasses import dataclass
 from typing import List, Union
 import bpy
 
+PYTHON = os.path.realpath(sys.executable)
 
-def run_python(args: str | List[str]):
-    python = os.path.realpath(sys.executable)
 
+def run_python(args: str | List[str]):
     if isinstance(args, str):
-        args = [python] + args.split(" ")
+        args = [PYTHON] + args.split(" ")
     elif isinstance(args, list):
-        args = [python] + args
+        args = [PYTHON] + args
     else:
         raise ValueError(
             "Arguments must be a string to split into individual arguments by space"
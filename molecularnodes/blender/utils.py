@@ -1,11 +1,18 @@
+import os
+from functools import lru_cache
 import bpy
 from pathlib import Path
 
 
+@lru_cache(maxsize=256)
+def _abspath(path: str, blend_filepath: str) -> Path:
+    # blend_filepath is part of the cache key as '//' relative paths are expanded
+    # against the currently open .blend file
+    return Path(bpy.path.abspath(path))
+
+
 def path_resolve(path: str | Path) -> Path:
-    if isinstance(path, str):
-        return Path(bpy.path.abspath(path))
-    elif isinstance(path, Path):
-        return Path(bpy.path.abspath(str(path)))
-    else:
+    try:
+        return _abspath(os.fspath(path), bpy.data.filepath)
+    except TypeError:
         raise ValueError(f"Unable to resolve path: {path}")
@@ -313,8 +313,6 @@ def _create_object(
     color_plddt: bool = False,
     verbose=False,
 ) -> Tuple[bpy.types.Object, bpy.types.Collection]:
-    import biotite.structure as struc
-
     frames = None
     is_stack = isinstance(array, struc.AtomArrayStack)
 
@@ -1,17 +1,49 @@
 import itertools
+import re
+from functools import cached_property
 
 import biotite.structure as struc
 import biotite.structure.io.pdbx as pdbx
 import numpy as np
+from biotite import InvalidFileError
 
 from .molecule import Molecule
 
+MATRIX_COLUMNS = (
+    "matrix[1][1]",
+    "matrix[1][2]",
+    "matrix[1][3]",
+    "vector[1]",
+    "matrix[2][1]",
+    "matrix[2][2]",
+    "matrix[2][3]",
+    "vector[2]",
+    "matrix[3][1]",
+    "matrix[3][2]",
+    "matrix[3][3]",
+    "vector[3]",
+)
+
+# matches either a range of operation IDs '5-8' or a single operation ID '3'
+OPER_PATTERN = re.compile(r"(\d+)-(\d+)|([^,()\s]+)")
+
 
 class PDBX(Molecule):
     def __init__(self, file_path):
         super().__init__(file_path=file_path)
         # self.file = self._read(file_path)
 
+        # `array` is only parsed on first access, so check for atoms up front so that
+        # files such as chemical components still fail here and fall back to OldCIF
+        if "atom_site" not in self.file.block:
+            raise InvalidFileError("Missing 'atom_site' category in file")
+
+    @cached_property
+    def array(self):
+        # parsing the atoms and connecting bonds via residue names is expensive, so
+        # defer it until the array is first needed and then keep the result
+        return self.get_structure()
+
     @property
     def entity_ids(self):
         return self.file.block.get("entity").get("pdbx_description").as_array().tolist()
@@ -43,7 +75,7 @@ class PDBX(Molecule):
         array = pdbx.get_structure(self.file, extra_fields=extra_fields)
         array = self.set_extra_annotations(array, self.file)
 
-        if not array.bonds and bonds:
+        if bonds and not array.bonds:
             array.bonds = struc.bonds.connect_via_residue_names(
                 array, inter_residue=True
             )
@@ -53,33 +85,6 @@ class PDBX(Molecule):
     def _assemblies(self):
         return CIFAssemblyParser(self.file).get_assemblies()
 
-    @staticmethod
-    def _extract_matrices(category):
-        matrix_columns = [
-            "matrix[1][1]",
-            "matrix[1][2]",
-            "matrix[1][3]",
-            "vector[1]",
-            "matrix[2][1]",
-            "matrix[2][2]",
-            "matrix[2][3]",
-            "vector[2]",
-            "matrix[3][1]",
-            "matrix[3][2]",
-            "matrix[3][3]",
-            "vector[3]",
-        ]
-
-        columns = [category[name].as_array().astype(float) for name in matrix_columns]
-        matrices = np.empty((len(columns[0]), 4, 4), float)
-
-        col_mask = np.tile((0, 1, 2, 3), 3)
-        row_mask = np.repeat((0, 1, 2), 4)
-        for column, coli, rowi in zip(columns, col_mask, row_mask):
-            matrices[:, rowi, coli] = column
-
-        return matrices
-
     @staticmethod
     def _get_entity_id(array, file):
         chain_ids = file.block["entity_poly"]["pdbx_strand_id"].as_array(str)
@@ -96,10 +101,13 @@ class PDBX(Molecule):
                 idx.append(i)
 
         entity_lookup = dict(zip(chains, idx))
-        chain_id_int = np.array(
-            [entity_lookup.get(chain, -1) for chain in array.chain_id], int
+
+        # only look up each unique chain once, then broadcast back to the atoms
+        unique_chains, inverse = np.unique(array.chain_id, return_inverse=True)
+        unique_entity_ids = np.array(
+            [entity_lookup.get(chain, -1) for chain in unique_chains], int
         )
-        return chain_id_int
+        return unique_entity_ids[inverse]
 
     @staticmethod
     def _get_secondary_structure(array, file):
@@ -143,17 +151,25 @@ class PDBX(Molecule):
             starts = np.empty(0, dtype=int)
             ends = np.empty(0, dtype=int)
             chains = np.empty(0, dtype=str)
-            id_label = np.empty(0, dtype=int)
+            id_label = np.empty(0, dtype=str)
 
         # most files will have a separate category for the beta sheets
         # this can just be appended to the other start / end / id and be processed
         # as normalquit
         sheet = file.block.get("struct_sheet_range")
         if sheet:
-            starts = np.append(starts, sheet["beg_auth_seq_id"].as_array().astype(int))
-            ends = np.append(ends, sheet["end_auth_seq_id"].as_array().astype(int))
-            chains = np.append(chains, sheet["end_auth_asym_id"].as_array().astype(str))
-            id_label = np.append(id_label, np.repeat("STRN", len(sheet["id"])))
+            starts = np.concatenate(
+                [starts, sheet["beg_auth_seq_id"].as_array().astype(int)]
+            )
+            ends = np.concatenate(
+                [ends, sheet["end_auth_seq_id"].as_array().astype(int)]
+            )
+            chains = np.concatenate(
+                [chains, sheet["end_auth_asym_id"].as_array().astype(str)]
+            )
+            id_label = np.concatenate(
+                [id_label, np.full(len(sheet["id"]), "STRN", dtype="U4")]
+            )
 
         if not conf and not sheet:
             raise KeyError
@@ -161,61 +177,64 @@ class PDBX(Molecule):
         # convert the string labels to integer representations of the SS
         # AH: 1, BS: 2, LOOP: 3
 
-        id_int = np.array([_ss_label_to_int(label) for label in id_label], int)
-
-        # create a lookup dictionary that enables lookup of secondary structure
-        # based on the chain_id and res_id values
+        # matches _ss_label_to_int(), with HELX taking precedence over STRN
+        id_int = np.full(len(id_label), 3, dtype=np.int8)
+        id_int[np.char.find(id_label, "STRN") >= 0] = 2
+        id_int[np.char.find(id_label, "HELX") >= 0] = 1
 
-        lookup = dict()
-        for chain in np.unique(chains):
-            arrays = []
-            mask = chain == chains
-            start_sub = starts[mask]
-            end_sub = ends[mask]
-            id_sub = id_int[mask]
+        # chains become small integer indices so they can be packed with the res_id
+        # into a single int64 key for each residue
+        chain_names, chain_idx = np.unique(chains, return_inverse=True)
 
-            for start, end, id in zip(start_sub, end_sub, id_sub):
-                idx = np.arange(start, end + 1, dtype=int)
-                arr = np.zeros((len(idx), 2), dtype=int)
-                arr[:, 0] = idx
-                arr[:, 1] = 3
-                arr[:, 1] = id
-                arrays.append(arr)
+        # the categories can be present without any rows, leaving nothing to annotate
+        if len(chain_names) == 0:
+            return np.zeros(len(array.chain_id), int)
 
-            lookup[chain] = dict(np.vstack(arrays).tolist())
+        # expand every start / end range into one entry per residue, so that each
+        # residue of each chain has a secondary structure value
+        lengths = np.maximum(ends - starts + 1, 0)
+        offsets = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        ss_res = np.repeat(starts, lengths) + offsets
+        ss_chain_idx = np.repeat(chain_idx, lengths)
+        ss_values = np.repeat(id_int, lengths)
+
+        # lookup the SS annotation based on the packed chain_id and res_id key. The
+        # stable sort and searching from the right means later entries take
+        # precedence where ranges overlap
+        ss_keys = _pack_chain_res(ss_chain_idx, ss_res)
+        order = np.argsort(ss_keys, kind="stable")
+        ss_keys = ss_keys[order]
+        ss_values = ss_values[order]
+
+        # only peptide atoms get an annotation, everything else stays as 0, so the
+        # lookup is only done for the amino acids
+        is_aa = struc.filter_amino_acids(array)
+        chain_id = array.chain_id[is_aa]
+        atom_chain_idx = np.clip(
+            np.searchsorted(chain_names, chain_id), 0, len(chain_names) - 1
+        )
+        has_chain = chain_names[atom_chain_idx] == chain_id
+        atom_keys = _pack_chain_res(atom_chain_idx, array.res_id[is_aa])
+
+        # residues without an annotation are part of a loop, unless the chain has
+        # no annotations at all
+        aa_ss = np.where(has_chain, 3, 0)
+        if len(ss_keys) > 0:
+            idx = np.searchsorted(ss_keys, atom_keys, side="right") - 1
+            idx = np.clip(idx, 0, None)
+            hit = has_chain & (ss_keys[idx] == atom_keys)
+            aa_ss[hit] = ss_values[idx[hit]]
 
-        # use the lookup dictionary to get the SS annotation based on the chain_id and res_id
         secondary_structure = np.zeros(len(array.chain_id), int)
-        for i, (chain, res) in enumerate(zip(array.chain_id, array.res_id)):
-            try:
-                secondary_structure[i] = lookup[chain].get(res, 3)
-            except KeyError:
-                secondary_structure[i] = 0
-
-        # assign SS to 0 where not peptide
-        secondary_structure[~struc.filter_amino_acids(array)] = 0
+        secondary_structure[is_aa] = aa_ss
         return secondary_structure
 
 
-def _parse_opers(oper):
-    # we want the example '1,3,(5-8)' to expand to (1, 3, 5, 6, 7, 8).
-    op_ids = list()
-
-    for group in oper.strip(")").split("("):
-        if "," in group:
-            for i in group.split(","):
-                op_ids.append()
-
-    for group in oper.split(","):
-        if "-" not in group:
-            op_ids.append(str(group))
-            continue
-
-        start, stop = [int(x) for x in group.strip("()").split("-")]
-        for i in range(start, stop + 1):
-            op_ids.append(str(i))
-
-    return op_ids
+def _pack_chain_res(chain_idx, res_id):
+    # chain index in the upper 32 bits, res_id (which can be negative) in the lower
+    return (chain_idx.astype(np.int64) << 32) | (res_id.astype(np.int64) & 0xFFFFFFFF)
 
 
 def _ss_label_to_int(label):
@@ -228,23 +247,11 @@ def _ss_label_to_int(label):
 
 
 class CIF(PDBX):
-    def __init__(self, file_path):
-        super().__init__(file_path)
-        # self.file_path = file_path
-        # self.file = self.read(file_path)
-        self.array = self.get_structure()
-
     def _read(self, file_path):
         return pdbx.CIFFile.read(file_path)
 
 
 class BCIF(PDBX):
-    def __init__(self, file_path):
-        super().__init__(file_path)
-        # self.file_path = file_path
-        # self.file = self.read(file_path)
-        self.array = self.get_structure()
-
     def _read(self, file_path):
         return pdbx.BinaryCIFFile.read(file_path)
 
@@ -254,21 +261,34 @@ class CIFAssemblyParser:
 
     def __init__(self, file_cif):
         self._file = file_cif
+        self._assembly_gen = None
+        self._transformation_dict = None
 
     def list_assemblies(self):
         return list(pdbx.list_assemblies(self._file).keys())
 
-    def get_transformations(self, assembly_id):
-        assembly_gen_category = self._file.block["pdbx_struct_assembly_gen"]
+    def _read_categories(self):
+        # decode the assembly_gen columns and the operation matrices once per file,
+        # rather than again for every assembly that is requested
+        if self._assembly_gen is None:
+            assembly_gen_category = self._file.block["pdbx_struct_assembly_gen"]
+            struct_oper_category = self._file.block["pdbx_struct_oper_list"]
+            self._assembly_gen = (
+                assembly_gen_category["assembly_id"].as_array(str),
+                assembly_gen_category["oper_expression"].as_array(str),
+                assembly_gen_category["asym_id_list"].as_array(str),
+            )
+            # Extract all possible transformations indexed by operation ID
+            self._transformation_dict = _extract_matrices(struct_oper_category)
 
-        struct_oper_category = self._file.block["pdbx_struct_oper_list"]
+        return self._assembly_gen, self._transformation_dict
 
-        if assembly_id not in assembly_gen_category["assembly_id"].as_array(str):
-            raise KeyError(f"File has no Assembly ID '{assembly_id}'")
+    def get_transformations(self, assembly_id):
+        assembly_gen, transformation_dict = self._read_categories()
+        assembly_ids, op_exprs, asym_id_exprs = assembly_gen
 
-        # Extract all possible transformations indexed by operation ID
-        # transformation_dict = _get_transformations(struct_oper_category)
-        transformation_dict = _extract_matrices(struct_oper_category)
+        if assembly_id not in assembly_ids:
+            raise KeyError(f"File has no Assembly ID '{assembly_id}'")
 
         # Get necessary transformations and the affected chain IDs
         # NOTE: The chains given here refer to the `label_asym_id` field
@@ -276,11 +296,7 @@ class CIFAssemblyParser:
         # However, by default `PDBxFile` uses the `auth_asym_id` as
         # chain ID
         matrices = []
-        for id, op_expr, asym_id_expr in zip(
-            assembly_gen_category["assembly_id"].as_array(str),
-            assembly_gen_category["oper_expression"].as_array(str),
-            assembly_gen_category["asym_id_list"].as_array(str),
-        ):
+        for id, op_expr, asym_id_expr in zip(assembly_ids, op_exprs, asym_id_exprs):
             # Find the operation expressions for given assembly ID
             # We already asserted that the ID is actually present
             if id == assembly_id:
@@ -301,32 +317,29 @@ class CIFAssemblyParser:
         return assembly_dict
 
 
+def _stack_matrices(category, scale=True):
+    # stack the 12 flat columns into (n, 12) and reshape into the (n, 3, 4) top
+    # rows of each matrix in a single copy, instead of scattering each column
+    columns = np.stack(
+        [
+            category[name].as_array().astype(np.float64, copy=False)
+            for name in MATRIX_COLUMNS
+        ],
+        axis=1,
+    )
+    n_rows = 4 if scale else 3
+    matrices = np.zeros((len(columns), n_rows, 4), np.float64)
+    matrices[:, :3, :] = columns.reshape(-1, 3, 4)
+    if scale:
+        matrices[:, 3, 3] = 1.0
+
+    return matrices
+
+
 def _extract_matrices(category, scale=True):
-    matrix_columns = [
-        "matrix[1][1]",
-        "matrix[1][2]",
-        "matrix[1][3]",
-        "vector[1]",
-        "matrix[2][1]",
-        "matrix[2][2]",
-        "matrix[2][3]",
-        "vector[2]",
-        "matrix[3][1]",
-        "matrix[3][2]",
-        "matrix[3][3]",
-        "vector[3]",
-    ]
-
-    columns = [category[name].as_array().astype(float) for name in matrix_columns]
-    n = 4 if scale else 3
-    matrices = np.empty((len(columns[0]), n, 4), float)
-
-    col_mask = np.tile((0, 1, 2, 3), 3)
-    row_mask = np.repeat((0, 1, 2), 4)
-    for column, coli, rowi in zip(columns, col_mask, row_mask):
-        matrices[:, rowi, coli] = column
-
-    return dict(zip(category["id"].as_array(str), matrices))
+    # these are converted with .tolist() and stored as double ID properties on the
+    # object, so they are kept as float64 to avoid adding float32 rounding noise
+    return dict(zip(category["id"].as_array(str), _stack_matrices(category, scale)))
 
 
 def _chain_transformations(rotations, translations):
@@ -389,26 +402,16 @@ def _parse_operation_expression(expression):
 
     operations = []
     for expr in expressions_per_step:
-        if "-" in expr:
-            if "," in expr:
-                for gexpr in expr.split(","):
-                    if "-" in gexpr:
-                        first, last = gexpr.split("-")
-                        operations.append(
-                            [str(id) for id in range(int(first), int(last) + 1)]
-                        )
-                    else:
-                        operations.append([gexpr])
+        # each step is a list of single IDs and ranges of IDs, which are expanded in
+        # a single scan. Ranges of operation IDs must be integers
+        step = []
+        for match in OPER_PATTERN.finditer(expr):
+            first, last, single = match.groups()
+            if single is not None:
+                step.append(single)
             else:
-                # Range of operation IDs, they must be integers
-                first, last = expr.split("-")
-                operations.append([str(id) for id in range(int(first), int(last) + 1)])
-        elif "," in expr:
-            # List of operation IDs
-            operations.append(expr.split(","))
-        else:
-            # Single operation ID
-            operations.append([expr])
+                step.extend(str(id) for id in range(int(first), int(last) + 1))
+        operations.append(step)
 
     # Cartesian product of operations
     return list(itertools.product(*operations))
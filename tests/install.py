@@ -6,15 +6,10 @@ import os
 def main():
     python = os.path.realpath(sys.executable)
 
-    commands = [
-        f"{python} -m pip install -r requirements.txt",
-        # test
-        # f'{python} -m pip uninstall pytest-snapshot'
-        f"{python} -m pip install pytest pytest-cov syrupy",
-    ]
-
-    for command in commands:
-        subprocess.run(command.split(" "))
+    # resolve and install the requirements and test dependencies together in a
+    # single pip invocation
+    command = f"{python} -m pip install -r requirements.txt pytest pytest-cov syrupy"
+    subprocess.run(command.split(" "))
 
 
 if __name__ == "__main__":
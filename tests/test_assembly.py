@@ -6,6 +6,7 @@ import biotite.structure.io.pdb as biotite_pdb
 import biotite.structure.io.pdbx as biotite_cif
 import molecularnodes.entities.molecule.pdb as pdb
 import molecularnodes.entities.ensemble.cif as cif
+import molecularnodes.entities.molecule.pdbx as pdbx
 
 
 DATA_DIR = join(dirname(realpath(__file__)), "data")
@@ -68,6 +69,34 @@ def test_get_transformations_cif(assembly_id):
     check_transformations(test_transformations, atoms, ref_assembly)
 
 
+def test_get_transformations_pdbx():
+    """
+    Compare the assemblies built from the transformations of the PDBX parser
+    with assemblies built in Biotite.
+
+    A single parser is used for all assemblies, so the categories which it decodes
+    once are reused between them.
+    """
+    cif_file = biotite_cif.CIFFile.read(join(DATA_DIR, "1f2n.cif"))
+    atoms = biotite_cif.get_structure(
+        # Make sure `label_asym_id` is used instead of `auth_asym_id`
+        cif_file,
+        model=1,
+        use_author_fields=False,
+    )
+    test_parser = pdbx.CIFAssemblyParser(cif_file)
+
+    for assembly_id in [str(i + 1) for i in range(5)]:
+        ref_assembly = biotite_cif.get_assembly(
+            cif_file, model=1, assembly_id=assembly_id
+        )
+        test_transformations = test_parser.get_transformations(assembly_id)
+        check_transformations(test_transformations, atoms, ref_assembly)
+
+    with pytest.raises(KeyError):
+        test_parser.get_transformations("missing")
+
+
 def check_transformations(transformations, atoms, ref_assembly):
     """
     Check if the given transformations applied on the given atoms
@@ -158,6 +158,12 @@ def test_load_small_mol(snapshot_custom):
         assert snapshot_custom == sample_attribute(mol, att).tolist()
 
 
+def test_load_small_mol_fallback():
+    mol = mn.entities.molecule.ui.parse(data_dir / "ASN.cif")
+    assert isinstance(mol, mn.entities.ensemble.cif.OldCIF)
+    assert len(mol.array) > 0
+
+
 def test_rcsb_cache(snapshot_custom):
     from pathlib import Path
     import tempfile
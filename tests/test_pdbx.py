@@ -1,6 +1,9 @@
 import molecularnodes as mn
 
 import random
+import numpy as np
+import biotite.structure as struc
+import biotite.structure.io.pdbx as pdbx
 from .constants import data_dir
 from .utils import NumpySnapshotExtension, sample_attribute
 
@@ -36,3 +39,88 @@ def test_secondary_structure_no_helix(snapshot_custom):
     assert snapshot_custom == sample_attribute(
         m.object, "sec_struct", n=500, evaluate=False
     )
+
+
+def test_extract_matrices_homogeneous():
+    bcif = mn.entities.BCIF(data_dir / "1f2n.bcif")
+    category = bcif.file.block["pdbx_struct_oper_list"]
+    extract = mn.entities.molecule.pdbx._extract_matrices
+    matrices = np.array(list(extract(category).values()))
+
+    assert matrices.shape == (len(category["id"]), 4, 4)
+    assert (matrices[:, 3, :3] == 0).all()
+    assert (matrices[:, 3, 3] == 1).all()
+
+    matrices_3x4 = np.array(list(extract(category, scale=False).values()))
+    assert matrices_3x4.shape == (len(category["id"]), 3, 4)
+    assert np.array_equal(matrices_3x4, matrices[:, :3, :])
+
+
+def test_parse_operation_expression():
+    parse = mn.entities.molecule.pdbx._parse_operation_expression
+    assert parse("1") == [("1",)]
+    assert parse("(1,3,5-7)") == [("1",), ("3",), ("5",), ("6",), ("7",)]
+    assert parse("(1-2,5)") == [("1",), ("2",), ("5",)]
+    # steps are applied right to left, forming the cartesian product
+    assert parse("(X0)(1-3)") == [("1", "X0"), ("2", "X0"), ("3", "X0")]
+
+
+def _ss_test_file(**categories):
+    block = pdbx.CIFBlock(
+        {name: pdbx.CIFCategory(columns) for name, columns in categories.items()}
+    )
+    return pdbx.CIFFile({"TEST": block})
+
+
+def _ss_test_atoms(chain_res):
+    return struc.array(
+        [
+            struc.Atom(
+                [0, 0, 0],
+                chain_id=chain,
+                res_id=res,
+                res_name="ALA",
+                atom_name="CA",
+                element="C",
+            )
+            for chain, res in chain_res
+        ]
+    )
+
+
+def test_get_ss_overlap_and_negative_res_id():
+    atoms = _ss_test_atoms(
+        [("A", -2), ("A", -1), ("A", 1), ("A", 2), ("A", 5), ("B", 1)]
+    )
+    file = _ss_test_file(
+        struct_conf={
+            "id": ["HELX_P1"],
+            "beg_auth_seq_id": ["-2"],
+            "end_auth_seq_id": ["1"],
+            "end_auth_asym_id": ["A"],
+        },
+        # overlaps the helix on residue 1, where the later sheet takes precedence
+        struct_sheet_range={
+            "id": ["1"],
+            "beg_auth_seq_id": ["1"],
+            "end_auth_seq_id": ["2"],
+            "end_auth_asym_id": ["A"],
+        },
+    )
+    sec_struct = mn.entities.molecule.pdbx.PDBX._get_secondary_structure(atoms, file)
+
+    # residue 5 of A is unannotated so is a loop, chain B has no annotations at all
+    assert sec_struct.tolist() == [1, 1, 2, 2, 3, 0]
+
+
+def test_get_ss_empty_categories():
+    atoms = _ss_test_atoms([("A", 1), ("A", 2)])
+    file = _ss_test_file(
+        struct_conf={
+            name: np.array([], dtype=str)
+            for name in ["id", "beg_auth_seq_id", "end_auth_seq_id", "end_auth_asym_id"]
+        }
+    )
+    sec_struct = mn.entities.molecule.pdbx.PDBX._get_secondary_structure(atoms, file)
+
+    assert sec_struct.tolist() == [0, 0]